@@ -1,13 +1,20 @@
 # Code to load the saved model for future use
+import os
+import math
+import functools
 import joblib
 import json
+import orjson
+import msgpack
 import keras
-from keras.losses import MeanSquaredError
+import tensorflow as tf
+from numba import njit
 from keras.models import load_model, model_from_json
 
 import pandas as pd
 import numpy as np
-from collections import deque
+import threading
+import queue
 import paho.mqtt.client as mqtt
 from datetime import datetime, timedelta
 
@@ -21,69 +28,440 @@ FORECAST = 'MB1Y/Temperature/Forecast'
 
 lookback = 10
 number_of_future_forecasts = 10
-temperatures = deque(maxlen=lookback)
-timestamps = deque(maxlen=lookback)
+# False: re-run the model on a sliding lookback window for every forecast, as the model was trained
+# True (opt-in): read the window once and carry the LSTM state through the forecasts (fewer LSTM cell
+# evaluations), this changes the forecasts and has not been validated against held-out data yet
+STATEFUL_ROLLOUT = False
+# 'numba': compiled NumPy LSTM cell, no TF call per forecast
+# 'tflite': quantized TFLite interpreters, 'xla': whole rollout compiled as one XLA tf.function
+INFERENCE_BACKEND = 'numba'
+# Sensor timestamps arrive as nanoseconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+# Offsets of the future timestamps (1 to 10 days ahead), created once instead of on every message
+future_deltas = [timedelta(days=i) for i in range(1, number_of_future_forecasts+1)]
+# Ring buffers with the last 'lookback' sensor readings, ring_head is the slot of the oldest reading
+temperature_ring = np.empty(lookback, dtype=np.float32)
+timestamp_ring = [None] * lookback
+ring_head = 0
+ring_count = 0
+# Holds at most one sensor window waiting for the forecast worker
+forecast_queue = queue.Queue(maxsize=1)
+
+## Split the saved model into its LSTM stack and the Dense/Dropout head on top of it
+## Supported: a Sequential model of one or more LSTM layers (only the last one without return_sequences)
+## followed by Dense and Dropout layers, e.g. LSTM -> LSTM -> Dense -> Dropout -> Dense
+## loaded_model: Loaded Keras model
+##Tuple of (lstm_layers, head_layers), or None if the architecture is not supported
+def lstm_stack_layers(loaded_model):
+    if not isinstance(loaded_model, keras.Sequential):
+        return None
+    layers = [layer for layer in loaded_model.layers if not isinstance(layer, keras.layers.InputLayer)]
+    lstm_layers = []
+    while len(lstm_layers) < len(layers) and isinstance(layers[len(lstm_layers)], keras.layers.LSTM):
+        lstm_layers.append(layers[len(lstm_layers)])
+    head_layers = layers[len(lstm_layers):]
+    if not lstm_layers or not any(isinstance(layer, keras.layers.Dense) for layer in head_layers):
+        return None
+    if not all(isinstance(layer, (keras.layers.Dense, keras.layers.Dropout)) for layer in head_layers):
+        return None
+    if any(layer.go_backwards or layer.return_sequences != (layer is not lstm_layers[-1]) for layer in lstm_layers):
+        return None
+    return lstm_layers, head_layers
+
+## Wrap the whole saved model with a fixed batch-of-1 window input
+## Used for the sliding-window rollout, works for any saved architecture
+## loaded_model: Loaded Keras model
+## lookback: Number of previous timesteps in the input window
+##Keras model mapping the window to {'y': prediction}
+def build_window_model(loaded_model, lookback=10):
+    # A fixed batch-of-1 input lets the converter lower the LSTM to TFLite builtin ops
+    window_input = keras.Input(shape=(lookback, 1), batch_size=1, name='window')
+    return keras.Model(window_input, {'y': loaded_model(window_input)})
+
+## Rebuild the saved LSTM stack so that the hidden and cell states of every LSTM layer are exposed
+## The encoder reads the whole lookback window once, the step model then advances one timestep at a time
+## lstm_layers, head_layers: Layers returned by lstm_stack_layers
+## lookback: Number of previous timesteps the encoder reads
+##Tuple of (encoder, step, state_names), Keras models sharing the original weights
+def build_stateful_lstm_models(lstm_layers, head_layers, lookback=10):
+    lstms = [keras.layers.LSTM.from_config({**layer.get_config(), 'return_state': True, 'stateful': False})
+             for layer in lstm_layers]
+    head = [type(layer).from_config(layer.get_config()) for layer in head_layers]
+    state_names = [name for i in range(len(lstms)) for name in (f'h{i}', f'c{i}')]
+
+    def run_stack(x, initial_states=None):
+        outputs = {}
+        for i, lstm in enumerate(lstms):
+            if initial_states is None:
+                x, h, c = lstm(x)
+            else:
+                x, h, c = lstm(x, initial_state=initial_states[2 * i:2 * i + 2])
+            outputs[f'h{i}'] = h
+            outputs[f'c{i}'] = c
+        for layer in head:
+            x = layer(x)
+        outputs['y'] = x
+        return outputs
+
+    # Encoder: lookback window -> first prediction and (h, c) of every LSTM layer after the last timestep
+    window_input = keras.Input(shape=(lookback, 1), batch_size=1, name='window')
+    encoder = keras.Model(window_input, run_stack(window_input))
+
+    # Step: previous prediction and all (h, c) -> next prediction and updated (h, c)
+    step_input = keras.Input(shape=(1, 1), batch_size=1, name='step')
+    state_inputs = [keras.Input(shape=(lstm_layers[i // 2].units,), batch_size=1, name=name)
+                    for i, name in enumerate(state_names)]
+    step = keras.Model([step_input] + state_inputs, run_stack(step_input, state_inputs))
+
+    for rebuilt, original in zip(lstms + head, lstm_layers + head_layers):
+        rebuilt.set_weights(original.get_weights())
+    return encoder, step, state_names
+
+## Convert a Keras model to a TFLite interpreter, caching the FlatBuffer next to the saved model
+## Weights are quantized to int8 (dynamic-range quantization), inputs and outputs stay float32
+## keras_model: Keras model with fixed batch-of-1 inputs
+## tflite_path: Where the converted model is stored
+##Tuple of (interpreter, input indices by name, output indices by name)
+def load_tflite_interpreter(keras_model, tflite_path):
+    if os.path.exists(tflite_path):
+        with open(tflite_path, 'rb') as tflite_file:
+            tflite_model = tflite_file.read()
+    else:
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        tflite_model = converter.convert()
+        with open(tflite_path, 'wb') as tflite_file:
+            tflite_file.write(tflite_model)
+    print(f" TFLite model loaded from: {tflite_path}")
+
+    # One persistent interpreter is used for every forecast, so tensors are allocated only once
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    # First invoke prepares the kernels, so it is done here instead of on the first MQTT message
+    interpreter.invoke()
+
+    # The signature keeps the Keras input/output names, the raw tensor order does not
+    signature = interpreter.get_signature_runner()
+    input_indices = {name: detail['index'] for name, detail in signature.get_input_details().items()}
+    output_indices = {name: detail['index'] for name, detail in signature.get_output_details().items()}
+    return interpreter, input_indices, output_indices
+
+## Compile the whole autoregressive rollout into a single XLA tf.function
+## All forecast steps run inside one graph call, there is no Python loop per step
+## encoder_model: Window model (build_window_model) or stateful encoder (build_stateful_lstm_models)
+## step_model, state_names: Stateful step model and its state names, None for the sliding rollout
+## lookback: Number of previous timesteps in the input window
+##tf.function mapping a scaled (1, lookback, 1) window to the scaled forecasts
+def build_xla_rollout(encoder_model, step_model=None, state_names=None, lookback=10):
+    stateful = step_model is not None
+
+    @tf.function(input_signature=[tf.TensorSpec((1, lookback, 1), tf.float32)], jit_compile=True)
+    def rollout(window):
+        forecasts = tf.TensorArray(tf.float32, size=number_of_future_forecasts)
+        outputs = encoder_model(window)
+        y = outputs['y']
+        states = tuple(outputs[name] for name in state_names) if stateful else ()
+        forecasts = forecasts.write(0, y[0, 0])
+        for i in tf.range(1, number_of_future_forecasts):
+            if stateful:
+                outputs = step_model([tf.reshape(y, (1, 1, 1))] + list(states))
+                states = tuple(outputs[name] for name in state_names)
+            else:
+                window = tf.concat([window[:, 1:, :], tf.reshape(y, (1, 1, 1))], axis=1)
+                outputs = encoder_model(window)
+            y = outputs['y']
+            forecasts = forecasts.write(i, y[0, 0])
+        return tf.reshape(forecasts.stack(), (number_of_future_forecasts, 1))
+    return rollout
+
+# Dense activations supported by the Numba rollout, passed to the compiled code as integer codes
+NUMBA_DENSE_ACTIVATIONS = {
+    keras.activations.linear: 0,
+    keras.activations.sigmoid: 1,
+    keras.activations.tanh: 2,
+    keras.activations.relu: 3,
+}
+
+## Export the LSTM stack and Dense head weights as contiguous float32 arrays for the Numba rollout
+## Keras stores the four gates side by side in the order input, forget, cell, output
+## Raises ValueError if the architecture is not covered by the Numba rollout
+## loaded_model: Loaded Keras model
+##Tuple of (kernels, recurrent_kernels, biases, dense_kernels, dense_biases, dense_activations)
+def extract_lstm_weights(loaded_model):
+    stack = lstm_stack_layers(loaded_model)
+    if stack is None:
+        raise ValueError("Numba rollout needs a Sequential model of LSTM layers followed by Dense/Dropout layers")
+    lstm_layers, head_layers = stack
+    dense_layers = [layer for layer in head_layers if isinstance(layer, keras.layers.Dense)]
+    for layer in lstm_layers:
+        if (layer.activation is not keras.activations.tanh or layer.recurrent_activation is not keras.activations.sigmoid
+                or not layer.use_bias):
+            raise ValueError(f"Numba rollout needs default tanh/sigmoid LSTM layers with bias, got {layer.name}")
+    for layer in dense_layers:
+        if layer.activation not in NUMBA_DENSE_ACTIVATIONS or not layer.use_bias:
+            raise ValueError(f"Numba rollout does not support the activation of Dense layer {layer.name}")
+    if dense_layers[-1].units != 1 or lstm_layers[0].get_weights()[0].shape[0] != 1:
+        raise ValueError("Numba rollout needs a single input feature and a single output value")
+
+    as_float32 = lambda weights: np.ascontiguousarray(weights, dtype=np.float32)
+    kernels, recurrent_kernels, biases = zip(*[[as_float32(w) for w in layer.get_weights()] for layer in lstm_layers])
+    dense_kernels, dense_biases = zip(*[[as_float32(w) for w in layer.get_weights()] for layer in dense_layers])
+    dense_activations = np.array([NUMBA_DENSE_ACTIVATIONS[layer.activation] for layer in dense_layers], dtype=np.int64)
+    return kernels, recurrent_kernels, biases, dense_kernels, dense_biases, dense_activations
+
+## One LSTM timestep, h and c are updated in place
+## x: Input vector of the timestep (the value itself for the first layer, h of the layer below otherwise)
+## z: Scratch buffer of size 4 * units for the gate pre-activations
+@njit(cache=True, fastmath=True)
+def lstm_cell(x, h, c, kernel, recurrent_kernel, bias, z):
+    units = h.shape[0]
+    # z = x @ W + h @ U + b, computed before h is overwritten (row-wise over W and U for contiguous access)
+    for j in range(4 * units):
+        z[j] = bias[j]
+    for k in range(x.shape[0]):
+        x_k = x[k]
+        for j in range(4 * units):
+            z[j] += x_k * kernel[k, j]
+    for k in range(units):
+        h_k = h[k]
+        for j in range(4 * units):
+            z[j] += h_k * recurrent_kernel[k, j]
+    for k in range(units):
+        input_gate = 1.0 / (1.0 + math.exp(-z[k]))
+        forget_gate = 1.0 / (1.0 + math.exp(-z[units + k]))
+        candidate = math.tanh(z[2 * units + k])
+        output_gate = 1.0 / (1.0 + math.exp(-z[3 * units + k]))
+        c[k] = forget_gate * c[k] + input_gate * candidate
+        h[k] = output_gate * math.tanh(c[k])
+
+## Dense head on top of the last LSTM layer, returns the single output value
+@njit(cache=True, fastmath=True)
+def dense_head(h, dense_kernels, dense_biases, dense_activations):
+    values = h
+    for layer in range(len(dense_kernels)):
+        kernel = dense_kernels[layer]
+        outputs = dense_biases[layer].copy()
+        for k in range(values.shape[0]):
+            v_k = values[k]
+            for j in range(outputs.shape[0]):
+                outputs[j] += v_k * kernel[k, j]
+        activation = dense_activations[layer]
+        for j in range(outputs.shape[0]):
+            if activation == 1:
+                outputs[j] = 1.0 / (1.0 + math.exp(-outputs[j]))
+            elif activation == 2:
+                outputs[j] = math.tanh(outputs[j])
+            elif activation == 3:
+                outputs[j] = max(outputs[j], 0.0)
+        values = outputs
+    return values[0]
+
+## Autoregressive rollout of the LSTM stack + Dense head without TensorFlow
+## window: Scaled float32 lookback window of shape (lookback,)
+## kernels ... dense_activations: Weights returned by extract_lstm_weights
+## steps: Number of future forecasts
+## stateful: Carry (h, c) through the forecasts (see STATEFUL_ROLLOUT) instead of re-reading a sliding window
+##Scaled forecasts of shape (steps,)
+@njit(cache=True, fastmath=True)
+def rollout_with_numba(window, kernels, recurrent_kernels, biases, dense_kernels, dense_biases, dense_activations,
+                       steps, stateful):
+    n_layers = len(kernels)
+    lookback = window.shape[0]
+    hs = []
+    cs = []
+    zs = []
+    for layer in range(n_layers):
+        units = recurrent_kernels[layer].shape[0]
+        hs.append(np.zeros(units, dtype=np.float32))
+        cs.append(np.zeros(units, dtype=np.float32))
+        zs.append(np.empty(4 * units, dtype=np.float32))
+    x = np.empty(1, dtype=np.float32)
+    sliding_window = window.copy()
+    forecasts = np.empty(steps, dtype=np.float32)
+    for step in range(steps):
+        read_window = step == 0 or not stateful
+        if read_window:
+            # Read the (sliding) window from a zero state
+            for layer in range(n_layers):
+                hs[layer][:] = 0.0
+                cs[layer][:] = 0.0
+            timesteps = lookback
+        else:
+            # Feed the previous prediction as the next timestep
+            timesteps = 1
+        for t in range(timesteps):
+            x[0] = sliding_window[t] if read_window else forecasts[step - 1]
+            layer_input = x
+            for layer in range(n_layers):
+                lstm_cell(layer_input, hs[layer], cs[layer], kernels[layer], recurrent_kernels[layer],
+                          biases[layer], zs[layer])
+                layer_input = hs[layer]
+        y = dense_head(hs[n_layers - 1], dense_kernels, dense_biases, dense_activations)
+        forecasts[step] = y
+        if not stateful:
+            sliding_window[:-1] = sliding_window[1:]
+            sliding_window[-1] = y
+    return forecasts
 
 ## Load the LSTM model for temperature forecasting
 ## Function to load the model, scaler, and configuration
 ## timestamp: The timestamp of the saved model (e.g., "20240816_143022")
 ## save_dir: Directory where models are saved
+## backend: Inference backend, None uses INFERENCE_BACKEND at call time
+## stateful: Rollout mode, None uses STATEFUL_ROLLOUT at call time
 ##Dictionary containing model, scaler, and configuration
-def load_temperature_lstm_model(timestamp, save_dir='/Users/gulcinecesasmaz/Desktop/Master_Studies/MDBlue_Data/Saved_LSTMModel_Temperature_Univariate'):
-    
-    # Load the complete model with custom loss function
+## Results are cached per (timestamp, save_dir, backend, stateful), repeated calls in the same process share the loaded model
+def load_temperature_lstm_model(timestamp, save_dir='/Users/gulcinecesasmaz/Desktop/Master_Studies/MDBlue_Data/Saved_LSTMModel_Temperature_Univariate',
+                                backend=None, stateful=None):
+    # Resolve the globals here so that changing them selects (and caches) another set of components
+    backend = INFERENCE_BACKEND if backend is None else backend
+    stateful = STATEFUL_ROLLOUT if stateful is None else stateful
+    return _load_temperature_lstm_model(timestamp, save_dir, backend, bool(stateful))
+
+@functools.lru_cache(maxsize=4)
+def _load_temperature_lstm_model(timestamp, save_dir, backend, stateful):
+
+    # Load the model for inference only, the loss and optimizer state are not rebuilt
     model_path = f"{save_dir}/temperature_lstm_model_{timestamp}.h5"
-    loaded_model = load_model(model_path, custom_objects={'mse': MeanSquaredError()})
+    loaded_model = load_model(model_path, compile=False)
     print(f" Model loaded from: {model_path}")
-    
+
+    # Only the selected backend is built, the Numba rollout needs no TensorFlow models at all
+    # The Numba rollout covers LSTM stacks with a Dense head, other models fall back to the TFLite interpreters
+    numba_weights = encoder = step = xla_rollout = state_names = None
+    if backend == 'numba':
+        try:
+            numba_weights = extract_lstm_weights(loaded_model)
+        except ValueError as e:
+            print(f" {e}, using the TFLite backend instead")
+            backend = 'tflite'
+
+    # The stateful rollout needs the LSTM stack rebuilt with explicit states, the sliding rollout uses the whole model
+    stack = lstm_stack_layers(loaded_model)
+    if stateful and stack is None:
+        print(" Stateful rollout does not support this model architecture, using the sliding window rollout")
+        stateful = False
+    if backend != 'numba':
+        if stateful:
+            encoder_model, step_model, state_names = build_stateful_lstm_models(*stack, lookback)
+        else:
+            encoder_model, step_model = build_window_model(loaded_model, lookback), None
+
+    if backend == 'xla':
+        # The XLA rollout is traced and compiled on its first call
+        xla_rollout = build_xla_rollout(encoder_model, step_model, state_names, lookback)
+    elif backend != 'numba':
+        # Convert the models to TFLite once and reuse the saved files on later runs
+        if stateful:
+            encoder = load_tflite_interpreter(encoder_model, f"{save_dir}/temperature_lstm_stateful_encoder_{timestamp}_int8.tflite")
+            step = load_tflite_interpreter(step_model, f"{save_dir}/temperature_lstm_stateful_step_{timestamp}_int8.tflite")
+        else:
+            encoder = load_tflite_interpreter(encoder_model, f"{save_dir}/temperature_lstm_model_{timestamp}_int8.tflite")
+
     # Load the scaler
     scaler_path = f"{save_dir}/temperature_scaler_{timestamp}.joblib"
     loaded_scaler = joblib.load(scaler_path)
     print(f"Scaler loaded from: {scaler_path}")
-    
+
     # Load configuration
     config_path = f"{save_dir}/temperature_model_config_{timestamp}.json"
     with open(config_path, 'r') as config_file:
         config = json.load(config_file)
     print(f" Configuration loaded from: {config_path}")
-    
+
     # Load data info
     data_info_path = f"{save_dir}/temperature_data_info_{timestamp}.json"
     with open(data_info_path, 'r') as info_file:
         data_info = json.load(info_file)
     print(f" Data info loaded from: {data_info_path}")
-    
+
     return {
         'model': loaded_model,
+        'backend': backend,
+        'stateful': stateful,
+        'state_names': state_names,
+        'encoder': encoder,
+        'step': step,
+        'xla_rollout': xla_rollout,
+        'numba_weights': numba_weights,
         'scaler': loaded_scaler,
+        # Single-feature MinMaxScaler parameters, used directly for the affine (inverse) transform
+        'scaler_min': float(loaded_scaler.min_[0]),
+        'scaler_scale': float(loaded_scaler.scale_[0]),
         'config': config,
         'data_info': data_info
     }
 
-def predict_with_loaded_model(model, scaler, new_data, lookback=10):
+## Autoregressive rollout on the TFLite interpreters
+## components: Dictionary returned by load_temperature_lstm_model
+## last_input: Scaled float32 window of shape (1, lookback, 1), shifted in place for the sliding rollout
+##Scaled forecasts of shape (number_of_future_forecasts, 1)
+def rollout_with_tflite(components, last_input):
+    encoder, encoder_inputs, encoder_outputs = components['encoder']
+
+    future_forecasts = np.empty((number_of_future_forecasts, 1), dtype=np.float32)
+    encoder.set_tensor(encoder_inputs['window'], last_input)
+    encoder.invoke()
+    future_forecasts[0, 0] = encoder.get_tensor(encoder_outputs['y']).item()
+    if components['stateful']:
+        step, step_inputs, step_outputs = components['step']
+        state_names = components['state_names']
+        step_input = np.empty((1, 1, 1), dtype=np.float32)
+        states = [encoder.get_tensor(encoder_outputs[name]) for name in state_names]
+        for i in range(1, number_of_future_forecasts):
+            # Rolling forecast: feed the previous prediction together with the carried LSTM states
+            step_input[0, 0, 0] = future_forecasts[i - 1, 0]
+            step.set_tensor(step_inputs['step'], step_input)
+            for name, state in zip(state_names, states):
+                step.set_tensor(step_inputs[name], state)
+            step.invoke()
+            future_forecasts[i, 0] = step.get_tensor(step_outputs['y']).item()
+            states = [step.get_tensor(step_outputs[name]) for name in state_names]
+    else:
+        for i in range(1, number_of_future_forecasts):
+            # Rolling forecast: shift the window left in place and put the previous prediction at the end
+            last_input[0, :-1, 0] = last_input[0, 1:, 0]
+            last_input[0, -1, 0] = future_forecasts[i - 1, 0]
+            encoder.set_tensor(encoder_inputs['window'], last_input)
+            encoder.invoke()
+            future_forecasts[i, 0] = encoder.get_tensor(encoder_outputs['y']).item()
+    return future_forecasts
+
+def predict_with_loaded_model(components, new_data, lookback=10):
 ## Forecasting 10 days into the future
 ##Used loaded model to predict future values based on the last 'lookback' days of data
-## model: Loaded Keras model
-## scaler: Loaded MinMaxScaler
+## With STATEFUL_ROLLOUT the window is read once and each prediction is fed back as a single timestep,
+## so the LSTM state carries the whole window plus earlier predictions instead of a sliding window.
+## components: Dictionary returned by load_temperature_lstm_model (its 'backend' selects the rollout)
 ##new_data: New temperature data (pandas Series or array)
 ##lookback: Number of previous timesteps to use for prediction
 
-    
-    # Normalize new data
-    scaled_new_data = scaler.transform(new_data.reshape(-1, 1))
-    last_input = scaled_new_data.reshape(1, lookback, 1)
+    scaler_min = components['scaler_min']
+    scaler_scale = components['scaler_scale']
+
+    # The whole pipeline works in float32, the dtype of the model weights
+    new_data = np.asarray(new_data, dtype=np.float32)
+
+    # Normalize new data into a window buffer that is allocated once per forecast
+    # MinMaxScaler.transform is x * scale_ + min_, applied in place without sklearn's input validation
+    last_input = np.empty((1, lookback, 1), dtype=np.float32)
+    last_input[0, :, 0] = new_data
+    last_input *= scaler_scale
+    last_input += scaler_min
     # Make predictions
 
-    future_forecasts = np.zeros((number_of_future_forecasts, 1))
-    for i in range(number_of_future_forecasts):
-        future_prediction = model.predict(last_input)
-        future_forecasts[i] = future_prediction
-        # Rolling forecast: update last_input with the new prediction
-        last_input = np.append(last_input[:, 1:, :], future_prediction.reshape(1, 1, 1), axis=1)
+    if components['backend'] == 'numba':
+        future_forecasts = rollout_with_numba(last_input[0, :, 0], *components['numba_weights'],
+                                              number_of_future_forecasts, components['stateful']).reshape(-1, 1)
+    elif components['backend'] == 'xla':
+        future_forecasts = np.array(components['xla_rollout'](last_input))
+    else:
+        future_forecasts = rollout_with_tflite(components, last_input)
 
     #print("Future forecasts shape:", future_forecasts.shape)
-    # Inverse transform future forecasts
-    future_forecasts = scaler.inverse_transform(future_forecasts)
+    # Inverse transform future forecasts in place: (x - min_) / scale_
+    future_forecasts -= scaler_min
+    future_forecasts /= scaler_scale
     return future_forecasts
 
 # Load the model and other components
@@ -93,62 +471,86 @@ scaler = loaded_components['scaler']
 config = loaded_components['config']
 data_info = loaded_components['data_info']
 
+# Warm up the whole forecasting path once so the first sensor message only sees steady-state latency
+predict_with_loaded_model(loaded_components, np.zeros(lookback, dtype=np.float32), lookback)
+
 
 def on_connect(client, userdata, flags, rc):
     print(f"Connected with result code {rc}")
-    client.subscribe(SENSOR_TOPIC)
+    # QoS 0: sensor readings are a best-effort time series, no PUBACK/PUBREC/PUBCOMP handshakes
+    client.subscribe(SENSOR_TOPIC, qos=0)
 
 def on_message(client, userdata, msg):
+    global ring_head, ring_count
     try:
-        data = json.loads(msg.payload.decode())
+        # Sensor messages are MessagePack encoded, see mqtt_producer.py
+        data = msgpack.unpackb(msg.payload, raw=False)
         temp = data.get('temperature')
-        ts = data.get('timestamp')
-
-        temperatures.append(temp)
-        timestamps.append(ts)
-        if(len(temperatures) >= lookback):
-            # Prepare data for prediction
-            reordered_temperature_data = np.array(list(temperatures)[-lookback:])
-            reordered_timestamp_data = list(timestamps)[-lookback:]
-            
-            # Get the last timestamp and create 10 future timestamps
-            last_timestamp = reordered_timestamp_data[-1]
+        # Kept as datetime, orjson publishes it as an ISO 8601 string
+        ts = EPOCH + timedelta(microseconds=data.get('timestamp') // 1000)
+
+        temperature_ring[ring_head] = temp
+        timestamp_ring[ring_head] = ts
+        ring_head = (ring_head + 1) % lookback
+        ring_count = min(ring_count + 1, lookback)
+        if(ring_count >= lookback):
+            # Prepare data for prediction: reorder the ring oldest-first in a single copy
+            # The copy is owned by the forecast worker, so the ring can keep filling meanwhile
+            reordered_temperature_data = np.concatenate((temperature_ring[ring_head:], temperature_ring[:ring_head]))
+            reordered_timestamp_data = timestamp_ring[ring_head:] + timestamp_ring[:ring_head]
             
-            # Convert to datetime if it's a string
-            if isinstance(last_timestamp, str):
-                last_datetime = datetime.fromisoformat(last_timestamp.replace('Z', '+00:00'))
-            else:
-                last_datetime = last_timestamp
+            # Hand the window to the forecast worker, the network loop thread is not blocked by inference
+            # If the worker is still busy the pending window is replaced, so only the newest one is forecast
+            try:
+                forecast_queue.put_nowait((reordered_temperature_data, reordered_timestamp_data))
+            except queue.Full:
+                try:
+                    forecast_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                forecast_queue.put_nowait((reordered_temperature_data, reordered_timestamp_data))
+        else:
+            print("Not enough data for prediction yet.")
+            print(f"Received message: {data} on topic {msg.topic}")
+    except Exception as e:
+        print(f"Error processing message: {e}")
+
+## Forecast worker running in its own thread
+## Takes the newest sensor window from forecast_queue, predicts the next values and publishes them
+## client: Connected MQTT client used for publishing
+def forecast_worker(client):
+    while True:
+        reordered_temperature_data, reordered_timestamp_data = forecast_queue.get()
+        try:
+            # Get the last timestamp (on_message already decoded it to a datetime) and create 10 future timestamps
+            last_datetime = reordered_timestamp_data[-1]
             
             # Generate future timestamps (1 day apart each)
-            future_timestamps = []
-            for i in range(1, number_of_future_forecasts+1):  # 1 to 10 days ahead
-                future_date = last_datetime + timedelta(days=i)
-                future_timestamps.append(future_date.isoformat())
+            future_timestamps = [(last_datetime + delta).isoformat() for delta in future_deltas]
 
             # print(f"Future timestamps: {future_timestamps}")
 
-            forecasts = predict_with_loaded_model(model, scaler, reordered_temperature_data, lookback)
+            forecasts = predict_with_loaded_model(loaded_components, reordered_temperature_data, lookback)
             
             message = {
                 "sensor_id": 1,
                 "sensor_timestamp": reordered_timestamp_data,
-                "sensor_data": reordered_temperature_data.tolist(),
+                "sensor_data": reordered_temperature_data,
                 "future_timestamps": future_timestamps,
-                "forecasts": forecasts.flatten().tolist()
+                "forecasts": forecasts.flatten()
             }
             # print(f"Publishing message {message}")
-            client.publish(FORECAST, json.dumps(message))
-        else:
-            print("Not enough data for prediction yet.")
-            print(f"Received message: {data} on topic {msg.topic}")
-    except Exception as e:
-        print(f"Error processing message: {e}")
+            # numpy arrays are serialized directly by orjson, no .tolist() needed
+            # QoS 0: a lost forecast is replaced by the next one, so no delivery handshake is needed
+            client.publish(FORECAST, orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY), qos=0)
+        except Exception as e:
+            print(f"Error forecasting: {e}")
 
 def main():
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
+    threading.Thread(target=forecast_worker, args=(client,), daemon=True).start()
     client.connect(BROKER, PORT, 60)
     client.loop_forever()
 
@@ -1,8 +1,7 @@
 import paho.mqtt.client as mqtt
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from matplotlib.dates import DateFormatter
-import json
+import orjson
 from datetime import datetime
 import pandas as pd
 import numpy as np
@@ -94,55 +93,65 @@ class RealTimeForecastPlotter:
         # Initialize background color state
         self.current_background_color = 'white'
         
+        # Blitting state: each update only redraws the dynamic artists on top of a cached background, a full
+        # redraw of the static parts (axes, ticks, threshold lines, legend) is requested when limits or colors change
+        self.dynamic_artists = (self.line_sensor, self.line_forecast, self.connection_line,
+                                self.info_text, self.alert_text)
+        for artist in self.dynamic_artists:
+            artist.set_animated(True)
+        self.background = None
+        self.axis_limits = None
+        self.needs_full_redraw = False
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        
     def check_thresholds(self):
         """Check threshold violations and return alert status and message"""
         alert_status = 'normal'  # 'normal', 'warning', 'error'
         alert_messages = []
         
         try:
-            # Get values to check: last sensor value + all forecast values
-            values_to_check = []
-            
-            # Add last sensor value if available
-            if plot_data['sensor_data']:
-                last_sensor_value = plot_data['sensor_data'][-1]
-                values_to_check.append(('Current Sensor', last_sensor_value))
+            # Get values to check: last sensor value (if available) + all forecast values
+            has_sensor_value = bool(plot_data['sensor_data'])
+            values = np.array(plot_data['sensor_data'][-1:] + list(plot_data['forecasts']), dtype=float)
             
-            # Add all forecast values
-            if plot_data['forecasts']:
-                for i, forecast_value in enumerate(plot_data['forecasts']):
-                    values_to_check.append(('Forecast', forecast_value))
-            
-            if not values_to_check:
+            if values.size == 0:
                 return alert_status, []
             
-            # Check for ERROR thresholds first
-            error_violations = []
-            warning_violations = []
+            # Check all values at once, ERROR thresholds take precedence over WARNING thresholds
+            high_error = values > HIGH_ERROR_THRESHOLD
+            low_error = values < LOW_ERROR_THRESHOLD
+            high_warning = (values > HIGH_WARNING_THRESHOLD) & ~high_error & ~low_error
+            low_warning = (values < LOW_WARNING_THRESHOLD) & ~high_error & ~low_error & ~high_warning
+            
+            error_indices = np.flatnonzero(high_error | low_error)
+            warning_indices = np.flatnonzero(high_warning | low_warning)
             
-            for value_type, value in values_to_check:
-                if value > HIGH_ERROR_THRESHOLD:
-                    error_violations.append(f"{value_type}: {value:.2f}°C > {HIGH_ERROR_THRESHOLD}°C")
-                elif value < LOW_ERROR_THRESHOLD:
-                    error_violations.append(f"{value_type}: {value:.2f}°C < {LOW_ERROR_THRESHOLD}°C")
-                elif value > HIGH_WARNING_THRESHOLD:
-                    warning_violations.append(f"{value_type}: {value:.2f}°C > {HIGH_WARNING_THRESHOLD}°C")
-                elif value < LOW_WARNING_THRESHOLD:
-                    warning_violations.append(f"{value_type}: {value:.2f}°C < {LOW_WARNING_THRESHOLD}°C")
+            def format_violations(indices, high_mask, high_threshold, low_threshold):
+                # Only the violations that are shown (max 3) are formatted
+                messages = []
+                for i in indices[:3]:
+                    value_type = 'Current Sensor' if has_sensor_value and i == 0 else 'Forecast'
+                    if high_mask[i]:
+                        messages.append(f"{value_type}: {values[i]:.2f}°C > {high_threshold}°C")
+                    else:
+                        messages.append(f"{value_type}: {values[i]:.2f}°C < {low_threshold}°C")
+                return messages
             
             # Determine alert status and messages
-            if error_violations:
+            if error_indices.size:
                 alert_status = 'error'
                 alert_messages.append("ERROR THRESHOLD EXCEEDED!")
-                alert_messages.extend(error_violations[:3])  # Show max 3 violations
-                if len(error_violations) > 3:
-                    alert_messages.append(f"... and {len(error_violations) - 3} more violations")
-            elif warning_violations:
+                alert_messages.extend(format_violations(error_indices, high_error,
+                                                        HIGH_ERROR_THRESHOLD, LOW_ERROR_THRESHOLD))
+                if error_indices.size > 3:
+                    alert_messages.append(f"... and {error_indices.size - 3} more violations")
+            elif warning_indices.size:
                 alert_status = 'warning'
                 alert_messages.append("WARNING THRESHOLD EXCEEDED!")
-                alert_messages.extend(warning_violations[:3])  # Show max 3 violations
-                if len(warning_violations) > 3:
-                    alert_messages.append(f"... and {len(warning_violations) - 3} more violations")
+                alert_messages.extend(format_violations(warning_indices, high_warning,
+                                                        HIGH_WARNING_THRESHOLD, LOW_WARNING_THRESHOLD))
+                if warning_indices.size > 3:
+                    alert_messages.append(f"... and {warning_indices.size - 3} more violations")
             
             return alert_status, alert_messages
             
@@ -164,17 +173,20 @@ class RealTimeForecastPlotter:
             self.fig.patch.set_facecolor(new_color)
             self.ax.set_facecolor(new_color)
             self.current_background_color = new_color
+            self.needs_full_redraw = True
     
     def update_plot(self, frame):
         """Update the plot with new data"""
         try:
-            # Process all available data from queue
-            while not data_queue.empty():
+            # process_new_data replaces plot_data completely, so only the newest queued message is processed
+            latest_data = None
+            while True:
                 try:
-                    new_data = data_queue.get_nowait()
-                    self.process_new_data(new_data)
+                    latest_data = data_queue.get_nowait()
                 except queue.Empty:
                     break
+            if latest_data is not None:
+                self.process_new_data(latest_data)
             
             # Update the plot with current data
             self.redraw_plot()
@@ -183,11 +195,17 @@ class RealTimeForecastPlotter:
             alert_status, alert_messages = self.check_thresholds()
             self.update_background_color(alert_status)
             self.update_alert_text(alert_status, alert_messages)
+            
+            # Static artists only need to be re-rendered when the axis limits or background changed
+            if self.needs_full_redraw or self.background is None:
+                self.full_redraw()
+            else:
+                self.fig.canvas.restore_region(self.background)
+                self.draw_dynamic_artists()
+                self.fig.canvas.blit(self.ax.bbox)
                 
         except Exception as e:
             print(f"Error updating plot: {e}")
-        
-        return self.line_sensor, self.line_forecast, self.connection_line, self.info_text, self.alert_text
     
     def process_new_data(self, data):
         """Process new MQTT data and update plot_data"""
@@ -205,14 +223,15 @@ class RealTimeForecastPlotter:
             print(f"   Sensor data points: {len(sensor_data)}")
             print(f"   Forecast points: {len(forecasts)}")
             
-            # Convert timestamps to datetime objects
+            # Convert timestamps to datetime objects, each list is parsed in one vectorized call
+            # The explicit ISO8601 format skips pandas' per-call format inference
             if sensor_timestamps:
-                sensor_timestamps_dt = [pd.to_datetime(ts) for ts in sensor_timestamps]
+                sensor_timestamps_dt = list(pd.to_datetime(sensor_timestamps, format='ISO8601', cache=True).to_pydatetime())
             else:
                 sensor_timestamps_dt = []
             
             if future_timestamps:
-                future_timestamps_dt = [pd.to_datetime(ts) for ts in future_timestamps]
+                future_timestamps_dt = list(pd.to_datetime(future_timestamps, format='ISO8601', cache=True).to_pydatetime())
             else:
                 future_timestamps_dt = []
             
@@ -284,7 +303,6 @@ class RealTimeForecastPlotter:
                 time_max = max(all_timestamps)
                 time_range = time_max - time_min
                 padding = time_range * 0.05  # 5% padding
-                self.ax.set_xlim(time_min - padding, time_max + padding)
                 
                 # Y-axis scaling - ensure thresholds are visible
                 value_min = min(all_values)
@@ -294,11 +312,32 @@ class RealTimeForecastPlotter:
                 y_min = min(value_min, LOW_ERROR_THRESHOLD) - 2
                 y_max = max(value_max, HIGH_ERROR_THRESHOLD) + 2
                 
-                self.ax.set_ylim(y_min, y_max)
+                # Only touch the axes when the limits actually change, every change needs a full redraw
+                axis_limits = (time_min - padding, time_max + padding, y_min, y_max)
+                if axis_limits != self.axis_limits:
+                    self.ax.set_xlim(axis_limits[0], axis_limits[1])
+                    self.ax.set_ylim(axis_limits[2], axis_limits[3])
+                    self.axis_limits = axis_limits
+                    self.needs_full_redraw = True
                 
         except Exception as e:
             print(f"Error auto-scaling: {e}")
     
+    def full_redraw(self):
+        """Re-render the whole figure, on_draw caches the new background"""
+        self.fig.canvas.draw()
+        self.needs_full_redraw = False
+    
+    def on_draw(self, event):
+        """Cache the background after every full redraw (first show, resize, new limits or colors)"""
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_dynamic_artists()
+    
+    def draw_dynamic_artists(self):
+        """Draw the animated lines and texts, which full redraws leave out of the background"""
+        for artist in self.dynamic_artists:
+            self.ax.draw_artist(artist)
+    
     def update_info_text(self):
         """Update the information text box"""
         try:
@@ -360,7 +399,8 @@ def on_connect(client, userdata, flags, rc):
     """Callback for when the client receives a CONNACK response from the server"""
     if rc == 0:
         print(f"Connected to MQTT broker at {BROKER}:{PORT}")
-        client.subscribe(TOPIC)
+        # QoS 0: only the newest forecast is shown, so no delivery handshake is needed
+        client.subscribe(TOPIC, qos=0)
         print(f"Subscribed to topic: {TOPIC}")
         print(f"Threshold configuration:")
         print(f"  Low Error: < {LOW_ERROR_THRESHOLD}°C")
@@ -373,8 +413,8 @@ def on_connect(client, userdata, flags, rc):
 def on_message(client, userdata, msg):
     """Callback for when a PUBLISH message is received from the server"""
     try:
-        payload = msg.payload.decode()
-        data = json.loads(payload)
+        # orjson parses the payload bytes directly, no intermediate decoded string
+        data = orjson.loads(msg.payload)
         
         print(f"Received message on topic '{msg.topic}'")
         print(f"Message preview: sensor_id={data.get('sensor_id')}, "
@@ -398,14 +438,10 @@ def main():
     # Create plotter instance
     plotter = RealTimeForecastPlotter()
     
-    # Setup animation
-    ani = animation.FuncAnimation(
-        plotter.fig, 
-        plotter.update_plot, 
-        interval=500,  # Update every 500ms
-        blit=False,
-        cache_frame_data=False
-    )
+    # Update every 500ms, the timer has to stay referenced while the window is open
+    timer = plotter.fig.canvas.new_timer(interval=500)
+    timer.add_callback(plotter.update_plot, None)
+    timer.start()
 
     try:
         # Show the plot
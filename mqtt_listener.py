@@ -1,43 +1,77 @@
 import paho.mqtt.client as mqtt
 import matplotlib.pyplot as plt
-import json
+import msgpack
+import numpy as np
 from collections import deque
 
-## It is assumed that the incoming MQTT messages are JSON formatted with 'temperature' and 'timestamp' fields.
+## It is assumed that the incoming MQTT messages are MessagePack encoded with 'temperature' and 'timestamp' fields (see mqtt_producer.py).
 ## This script is for real-time plotting of temperature data received via MQTT. One of the plots is shared in thesis.
 BROKER = 'localhost'
 PORT = 1883
 TOPIC = 'MB1Y/Temperature'
 
 N = 100
-temperatures = deque(maxlen=N)
+# Preallocated plot buffers, the newest N temperatures are kept in order in ybuf[:count]
+xbuf = np.arange(N)
+ybuf = np.empty(N, dtype=np.float32)
+count = 0
 timestamps = deque(maxlen=N)
 
 plt.ion()
 fig, ax = plt.subplots()
-line, = ax.plot([], [], 'r-')
+# The line is animated: it is blitted on top of a cached background instead of redrawing the figure
+line, = ax.plot([], [], 'r-', animated=True)
 ax.set_xlabel('timestamp')
 ax.set_ylabel('Temperature')
 ax.set_title('Real-time Temperature Plot')
+ax.set_xlim(0, N - 1)
+background = None
+
+def on_draw(event):
+    # Every full redraw (first show, resize, new y-limits) refreshes the cached background
+    global background
+    background = fig.canvas.copy_from_bbox(ax.bbox)
+    ax.draw_artist(line)
+
+fig.canvas.mpl_connect('draw_event', on_draw)
 
 def on_connect(client, userdata, flags, rc):
     print(f"Connected with result code {rc}")
-    client.subscribe(TOPIC)
+    # QoS 0: best-effort delivery is enough for live plotting
+    client.subscribe(TOPIC, qos=0)
 
 def on_message(client, userdata, msg):
+    global count
     try:
-        data = json.loads(msg.payload.decode())
+        data = msgpack.unpackb(msg.payload, raw=False)
         temp = data.get('temperature')
         ts = data.get('timestamp')
         if temp is not None:
-            temperatures.append(temp)
-            timestamps.append(ts if ts else len(temperatures))
-            line.set_xdata(range(len(temperatures)))
-            line.set_ydata(list(temperatures))
-            ax.relim()
-            ax.autoscale_view()
-            plt.draw()
-            plt.pause(0.01)
+            # Append to the buffer, once it is full shift it left in place to drop the oldest value
+            if count < N:
+                ybuf[count] = temp
+                count += 1
+            else:
+                ybuf[:-1] = ybuf[1:]
+                ybuf[-1] = temp
+            timestamps.append(ts if ts else count)
+            line.set_data(xbuf[:count], ybuf[:count])
+            
+            # Axes and ticks are only redrawn when the new value falls outside the current y-range, or when
+            # the window has shrunk to less than half of it (an extreme value scrolled out of the buffer)
+            y_min, y_max = ax.get_ylim()
+            data_min = float(ybuf[:count].min())
+            data_max = float(ybuf[:count].max())
+            padding = max(1.0, 0.1 * (data_max - data_min))
+            fitted_span = data_max - data_min + 2 * padding
+            if background is None or not (y_min <= temp <= y_max) or y_max - y_min > 2 * fitted_span:
+                ax.set_ylim(data_min - padding, data_max + padding)
+                fig.canvas.draw()
+            else:
+                fig.canvas.restore_region(background)
+                ax.draw_artist(line)
+                fig.canvas.blit(ax.bbox)
+            fig.canvas.flush_events()
         print(f"Received message: {data} on topic {msg.topic}")
     except Exception as e:
         print(f"Error processing message: {e}")
@@ -1,13 +1,15 @@
 import paho.mqtt.client as mqtt
 import time
-import json
+import msgpack
 from datetime import datetime
 import pandas as pd
+import numpy as np
 
 ## To make it look like real-time, this Python script reads temperature data from a CSV file and publishes each entry to an MQTT broker with a 1-second interval.
 ## 1 second interval is used here for demonstration purposes; in a real-world scenario, this could be adjusted based on actual data frequency.
 ## every time you run this script, it will start publishing from the beginning of the CSV file. It connects to the MQTT broker,
 ## publishes each temperature reading along with its timestamp, and then waits for 1 second before publishing the next reading.
+## Messages are MessagePack encoded: {"sensor_id": int, "timestamp": nanoseconds since epoch (int), "temperature": float}
 # MQTT broker settings
 BROKER_ADDRESS = "localhost"
 PORT = 1883
@@ -24,6 +26,12 @@ temperature = dataset[['Temperature', 'timestamps']]
 temperature['timestamps'] = pd.to_datetime(temperature['timestamps'])
 temperature = temperature.set_index('timestamps')
 
+# Columnar arrays for the publish loop, timestamps are converted in one vectorized call up front
+# Timestamps are sent as integer nanoseconds, the ISO strings are only used for printing
+timestamps_ns = temperature.index.to_numpy().astype('datetime64[ns]').view(np.int64)
+iso_timestamps = np.datetime_as_string(temperature.index.to_numpy(), unit='s')
+temperature_values = temperature['Temperature'].to_numpy(dtype=np.float64)
+
 
 # Callback when the client connects to the broker
 def on_connect(client, userdata, flags, rc):
@@ -47,16 +55,15 @@ except Exception as e:
 client.loop_start()
 
 try:
-    for idx, row in temperature.iterrows():
-        timestamp = idx
-        value = row['Temperature']
+    for i in range(len(temperature_values)):
         message = {
             "sensor_id": 1,
-            "timestamp": timestamp.isoformat(),
-            "temperature": value
+            "timestamp": int(timestamps_ns[i]),
+            "temperature": float(temperature_values[i])
         }
-        print(f"Publishing message {idx}: {message}")
-        client.publish(TOPIC, json.dumps(message))
+        print(f"Publishing message {iso_timestamps[i]}: {message}")
+        # QoS 0: readings are a best-effort time series, no PUBACK round trip per message
+        client.publish(TOPIC, msgpack.packb(message, use_bin_type=True), qos=0)
         time.sleep(1)
 
 except KeyboardInterrupt: